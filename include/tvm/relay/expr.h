@@ -66,6 +66,23 @@ class ExprNode : public RelayNode {
   template<typename TTypeNode>
   inline const TTypeNode* type_as() const;
 
+  /*!
+   * \brief Lazily populated cache of the structural hash of this expression.
+   *
+   * \note Zero means the hash has not been computed.  The cache is only
+   *       maintained when the environment variable
+   *       TVM_USE_STRUCTURAL_HASH_CACHE is set; see UseStructuralHashCache.
+   *       The structural hash never depends on checked_type_, so type
+   *       inference does not stale the cache; a pass mutating any other
+   *       field in place must call InvalidateStructuralHash.
+   */
+  mutable size_t structural_hash_cache_{0};
+
+  /*! \brief Invalidate the cached structural hash after in-place mutation. */
+  void InvalidateStructuralHash() const {
+    structural_hash_cache_ = 0;
+  }
+
   static constexpr const char* _type_key = "relay.Expr";
   TVM_DECLARE_BASE_NODE_INFO(ExprNode, RelayNode);
 };
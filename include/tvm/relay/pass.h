@@ -478,6 +478,18 @@ struct StructuralHash {
   size_t operator()(const Expr& expr) const;
 };
 
+/*!
+ * \brief Whether the structural hash cache on ExprNode is enabled.
+ *
+ *  Controlled by the environment variable TVM_USE_STRUCTURAL_HASH_CACHE;
+ *  off by default.  When enabled, StructuralHash memoizes its result on the
+ *  hashed expression and AlphaEqual uses cached hashes to fail fast on
+ *  structurally different expressions.
+ *
+ * \return true if the cache is enabled.
+ */
+TVM_DLL bool UseStructuralHashCache();
+
 namespace vm {
 
 /*!
@@ -98,6 +98,19 @@ class AlphaEqualHandler:
   bool ExprEqual(const Expr& lhs, const Expr& rhs) {
     if (lhs.same_as(rhs)) return true;
     if (!lhs.defined() || !rhs.defined()) return false;
+    /* Fail fast on cached structural hashes.  This is only a negative
+     * filter: differing hashes prove the expressions are not alpha-equal,
+     * while equal hashes may be collisions, so the full walk still runs.
+     * The cached hashes were computed on stand-alone terms, which matches
+     * the comparison only while no variable has been mapped yet and free
+     * variables are compared by identity.
+     */
+    if (UseStructuralHashCache() && !map_free_var_ && equal_map_.empty() &&
+        lhs->structural_hash_cache_ != 0 &&
+        rhs->structural_hash_cache_ != 0 &&
+        lhs->structural_hash_cache_ != rhs->structural_hash_cache_) {
+      return false;
+    }
     auto it = equal_map_.find(lhs);
     if (it != equal_map_.end()) {
       return it->second.same_as(rhs);
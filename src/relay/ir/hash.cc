@@ -28,6 +28,7 @@
 #include <tvm/runtime/ndarray.h>
 #include <tvm/relay/pass.h>
 #include <tvm/attrs.h>
+#include <cstdlib>
 #include "type_functor.h"
 #include "../../lang/attr_functor.h"
 
@@ -217,7 +218,19 @@ class RelayHashHandler:
   }
 
   size_t BindVar(const NodeRef& var) {
-    size_t hash = std::hash<int>()(var_counter++);
+    size_t hash;
+    if (UseStructuralHashCache()) {
+      /* Cached hashes are compared across expressions, so the hash of a
+       * binder must not depend on traversal order: with memoized visits the
+       * counter advances once for a shared subtree but once per copy for a
+       * duplicated one, making alpha-equal expressions hash differently.
+       * Trade the positional information for order independence; the extra
+       * collisions are resolved by a full AlphaEqual walk.
+       */
+      hash = std::hash<std::string>()("relay.BoundVar");
+    } else {
+      hash = std::hash<int>()(var_counter++);
+    }
     CHECK_EQ(hash_map_.count(var), 0);
     if (auto var_node = var.as<VarNode>()) {
       hash = Combine(hash, TypeHash(var_node->type_annotation));
@@ -404,12 +417,25 @@ class RelayHashHandler:
   int var_counter = 0;
 };
 
+bool UseStructuralHashCache() {
+  static const bool use_cache = std::getenv("TVM_USE_STRUCTURAL_HASH_CACHE") != nullptr;
+  return use_cache;
+}
+
 size_t StructuralHash::operator()(const Type& type) const {
   return RelayHashHandler().TypeHash(type);
 }
 
 size_t StructuralHash::operator()(const Expr& expr) const {
-  return RelayHashHandler().ExprHash(expr);
+  if (!UseStructuralHashCache() || !expr.defined()) {
+    return RelayHashHandler().ExprHash(expr);
+  }
+  if (expr->structural_hash_cache_ == 0) {
+    size_t hash = RelayHashHandler().ExprHash(expr);
+    // zero marks "not computed", so remap an (unlikely) zero hash
+    expr->structural_hash_cache_ = hash == 0 ? 1 : hash;
+  }
+  return expr->structural_hash_cache_;
 }
 
 TVM_REGISTER_API("relay._ir_pass._expr_hash")
@@ -26,18 +26,27 @@
 #include <tvm/relay/expr_functor.h>
 #include <unordered_set>
 #include <utility>
+#include <vector>
 
 namespace tvm {
 namespace relay {
 
 // Creator of DependencyGraph
+//
+// The graph is built without recursing on the expression: a work stack of
+// frames drives the traversal, so arbitrarily deep programs do not overflow
+// the C++ stack.  Each expression is expanded once (edges and dummy scope
+// nodes are created, children are queued in visit order) and completed once
+// its children are done, which appends its dummy nodes and then the node
+// itself to post_dfs_order - the same order the recursive formulation
+// produced.
 class DependencyGraph::Creator : private ExprFunctor<void(const Expr& e)> {
  public:
   explicit Creator(common::Arena* arena)
     : arena_(arena) {}
 
   DependencyGraph Create(const Expr& body) {
-    this->VisitExpr(body);
+    this->Visit(body);
     return std::move(graph_);
   }
 
@@ -46,13 +55,26 @@ class DependencyGraph::Creator : private ExprFunctor<void(const Expr& e)> {
   common::Arena* arena_;
   // The output.
   DependencyGraph graph_;
+  // A node being visited: expanded once to create edges and queue children,
+  // then revisited after the children to emit the post-dfs ordering.
+  struct Frame {
+    Expr expr;
+    std::vector<DependencyGraph::Node*> dummies;
+    bool expanded;
+  };
+  // Children queued by the current expansion, in visit order.
+  std::vector<Expr> pending_children_;
+  // Dummy nodes created by the current expansion, in post-dfs emit order.
+  std::vector<DependencyGraph::Node*> pending_dummies_;
   // Update the message stored at the node.
   void Depend(DependencyGraph::Node* parent, const Expr& child) {
-    VisitExpr(child);
-
-    CHECK_NE(graph_.expr_node.count(child), 0);
+    if (graph_.expr_node.count(child) == 0) {
+      graph_.expr_node[child] = NewNode(false);
+    }
 
     Depend(parent, graph_.expr_node[child]);
+
+    pending_children_.push_back(child);
   }
 
   void Depend(DependencyGraph::Node* parent, DependencyGraph::Node* child) {
@@ -73,14 +95,39 @@ class DependencyGraph::Creator : private ExprFunctor<void(const Expr& e)> {
     return ret;
   }
 
-  void VisitExpr(const Expr& e) final {
-    if (visited_.count(e) == 0) {
-      if (graph_.expr_node.count(e) == 0) {
-        graph_.expr_node[e] = NewNode(false);
+  void Visit(const Expr& root) {
+    if (graph_.expr_node.count(root) == 0) {
+      graph_.expr_node[root] = NewNode(false);
+    }
+    std::vector<Frame> stack;
+    stack.push_back(Frame{root, {}, false});
+    while (!stack.empty()) {
+      Frame frame = std::move(stack.back());
+      stack.pop_back();
+      if (frame.expanded) {
+        for (DependencyGraph::Node* d : frame.dummies) {
+          graph_.post_dfs_order.push_back(d);
+        }
+        graph_.post_dfs_order.push_back(graph_.expr_node[frame.expr]);
+        continue;
+      }
+      if (visited_.count(frame.expr) != 0) {
+        continue;
+      }
+      visited_.insert(frame.expr);
+      pending_children_.clear();
+      pending_dummies_.clear();
+      ExprFunctor<void(const Expr&)>::VisitExpr(frame.expr);
+      frame.expanded = true;
+      frame.dummies = std::move(pending_dummies_);
+      std::vector<Expr> children = std::move(pending_children_);
+      stack.push_back(std::move(frame));
+      // push in reverse so the children are expanded in visit order
+      for (auto it = children.rbegin(); it != children.rend(); ++it) {
+        if (visited_.count(*it) == 0) {
+          stack.push_back(Frame{*it, {}, false});
+        }
       }
-      visited_.insert(e);
-      ExprFunctor<void(const Expr&)>::VisitExpr(e);
-      graph_.post_dfs_order.push_back(graph_.expr_node[e]);
     }
   }
 
@@ -129,8 +176,8 @@ class DependencyGraph::Creator : private ExprFunctor<void(const Expr& e)> {
     Depend(n, f);
     Depend(t, i->true_branch);
     Depend(f, i->false_branch);
-    graph_.post_dfs_order.push_back(f);
-    graph_.post_dfs_order.push_back(t);
+    pending_dummies_.push_back(f);
+    pending_dummies_.push_back(t);
   }
 
   void VisitExpr_(const FunctionNode* f) final {
@@ -138,7 +185,7 @@ class DependencyGraph::Creator : private ExprFunctor<void(const Expr& e)> {
     DependencyGraph::Node* b = NewNode(true);
     Depend(n, b);
     Depend(b, f->body);
-    graph_.post_dfs_order.push_back(b);
+    pending_dummies_.push_back(b);
   }
 
   void VisitExpr_(const LetNode* l) final {
@@ -147,7 +194,7 @@ class DependencyGraph::Creator : private ExprFunctor<void(const Expr& e)> {
     Depend(n, b);
     Depend(b, l->value);
     Depend(b, l->body);
-    graph_.post_dfs_order.push_back(b);
+    pending_dummies_.push_back(b);
   }
 
   void VisitExpr_(const MatchNode* m) final {
@@ -161,7 +208,7 @@ class DependencyGraph::Creator : private ExprFunctor<void(const Expr& e)> {
       v.push_back(b);
     }
     for (auto it = v.rbegin(); it != v.rend(); ++it) {
-      graph_.post_dfs_order.push_back(*it);
+      pending_dummies_.push_back(*it);
     }
   }
 
@@ -27,7 +27,8 @@
 #include <tvm/relay/expr.h>
 #include <tvm/relay/expr_functor.h>
 #include <tvm/relay/module.h>
-#include "pass_util.h"
+#include <unordered_set>
+#include <vector>
 
 namespace tvm {
 namespace relay {
@@ -36,50 +37,93 @@ FeatureSet DetectFeature(const Expr& expr) {
   if (!expr.defined()) {
     return FeatureSet::NoFeature();
   }
-  struct FeatureDetector : ExprVisitor {
-    std::unordered_set<Expr, NodeHash, NodeEqual> visited_;
-    FeatureSet fs = FeatureSet::NoFeature();
-    void VisitExpr(const Expr& expr) final {
-      if (visited_.count(expr) == 0) {
-        ExprVisitor::VisitExpr(expr);
-      } else {
-        if (!IsAtomic(expr)) {
-          fs += fGraph;
+  // Features are per-node facts and do not depend on traversal order, so
+  // instead of a recursive ExprVisitor (which can exhaust the C++ stack on
+  // deep programs) walk the unique subexpressions with an explicit work
+  // stack.  Each node is expanded exactly once; revisits of shared nodes
+  // contribute nothing, matching the recursive detector (whose revisit
+  // branch was shadowed by ExprVisitor's visit counter, so fGraph was
+  // never reported).  Turning fGraph detection on is a separate change:
+  // callers assert exact feature sets of programs with sharing.
+  FeatureSet fs = FeatureSet::NoFeature();
+  std::unordered_set<Expr, NodeHash, NodeEqual> visited;
+  std::vector<Expr> stack;
+  auto fvisit = [&](const Expr& e) {
+    if (visited.count(e) == 0) {
+      visited.insert(e);
+      stack.push_back(e);
+    }
+  };
+  fvisit(expr);
+  while (!stack.empty()) {
+    Expr e = stack.back();
+    stack.pop_back();
+    if (e.as<VarNode>()) {
+      fs += fVar;
+    } else if (e.as<GlobalVarNode>()) {
+      fs += fGlobalVar;
+    } else if (e.as<ConstantNode>()) {
+      fs += fConstant;
+    } else if (const auto* op = e.as<TupleNode>()) {
+      fs += fTuple;
+      for (const Expr& f : op->fields) {
+        fvisit(f);
+      }
+    } else if (const auto* op = e.as<TupleGetItemNode>()) {
+      fs += fTupleGetItem;
+      fvisit(op->tuple);
+    } else if (const auto* op = e.as<FunctionNode>()) {
+      fs += fFunction;
+      for (const Var& p : op->params) {
+        fvisit(p);
+      }
+      fvisit(op->body);
+    } else if (e.as<OpNode>()) {
+      fs += fOp;
+    } else if (const auto* op = e.as<CallNode>()) {
+      fs += fCall;
+      fvisit(op->op);
+      for (const Expr& a : op->args) {
+        fvisit(a);
+      }
+    } else if (const auto* op = e.as<LetNode>()) {
+      fs += fLet;
+      for (const Var& v : FreeVars(op->value)) {
+        if (op->var == v) {
+          fs += fLetRec;
         }
       }
+      fvisit(op->value);
+      fvisit(op->var);
+      fvisit(op->body);
+    } else if (const auto* op = e.as<IfNode>()) {
+      fs += fIf;
+      fvisit(op->cond);
+      fvisit(op->true_branch);
+      fvisit(op->false_branch);
+    } else if (const auto* op = e.as<RefCreateNode>()) {
+      fs += fRefCreate;
+      fvisit(op->value);
+    } else if (const auto* op = e.as<RefReadNode>()) {
+      fs += fRefRead;
+      fvisit(op->ref);
+    } else if (const auto* op = e.as<RefWriteNode>()) {
+      fs += fRefWrite;
+      fvisit(op->ref);
+      fvisit(op->value);
+    } else if (e.as<ConstructorNode>()) {
+      fs += fConstructor;
+    } else if (const auto* op = e.as<MatchNode>()) {
+      fs += fMatch;
+      fvisit(op->data);
+      for (const Clause& c : op->clauses) {
+        fvisit(c->rhs);
+      }
+    } else {
+      LOG(FATAL) << "unknown expression type: " << e;
     }
-#define DETECT_CONSTRUCT(CONSTRUCT_NAME, STMT)            \
-  void VisitExpr_(const CONSTRUCT_NAME##Node* op) final { \
-    STMT                                                  \
-    fs += f##CONSTRUCT_NAME;                              \
-    ExprVisitor::VisitExpr_(op);                          \
   }
-#define DETECT_DEFAULT_CONSTRUCT(CONSTRUCT_NAME) DETECT_CONSTRUCT(CONSTRUCT_NAME, {})
-    DETECT_DEFAULT_CONSTRUCT(Var)
-    DETECT_DEFAULT_CONSTRUCT(GlobalVar)
-    DETECT_DEFAULT_CONSTRUCT(Constant)
-    DETECT_DEFAULT_CONSTRUCT(Tuple)
-    DETECT_DEFAULT_CONSTRUCT(TupleGetItem)
-    DETECT_DEFAULT_CONSTRUCT(Function)
-    DETECT_DEFAULT_CONSTRUCT(Op)
-    DETECT_DEFAULT_CONSTRUCT(Call)
-    DETECT_CONSTRUCT(Let, {
-        for (const Var& v : FreeVars(op->value)) {
-          if (op->var == v) {
-            fs += fLetRec;
-          }
-        }
-      })
-    DETECT_DEFAULT_CONSTRUCT(If)
-    DETECT_DEFAULT_CONSTRUCT(RefCreate)
-    DETECT_DEFAULT_CONSTRUCT(RefRead)
-    DETECT_DEFAULT_CONSTRUCT(RefWrite)
-    DETECT_DEFAULT_CONSTRUCT(Constructor)
-    DETECT_DEFAULT_CONSTRUCT(Match)
-#undef DETECT_DEFAULT_CONSTRUCT
-  } fd;
-  fd(expr);
-  return fd.fs;
+  return fs;
 }
 
 FeatureSet DetectFeature(const Module& mod) {
@@ -27,6 +27,9 @@
 #include <tvm/relay/pass.h>
 #include <tvm/relay/expr_functor.h>
 #include <tvm/logging.h>
+#include <unordered_map>
+#include <utility>
+#include <vector>
 #include "let_list.h"
 #include "../../common/arena.h"
 #include "pass_util.h"
@@ -58,39 +61,140 @@ Scope ChildScope(const Scope& s) {
   return std::make_shared<ScopeNode>(s);
 }
 
-Scope LCA(Scope lhs, Scope rhs) {
-  while (lhs != rhs) {
-    if (lhs->level > rhs->level) {
-      lhs = lhs->parent;
-    } else if (lhs->level < rhs->level) {
-      rhs = rhs->parent;
-    } else {
-      lhs = lhs->parent;
-      rhs = rhs->parent;
+/* The scope of a node is the least common ancestor, in the scope tree, of the
+ * scopes of all its use sites.  Computing that directly - walking up the scope
+ * tree once per use site - is O(n * d) for n nodes and scope depth d, which
+ * dominates conversion time on deep networks.
+ *
+ * Observe that the least common ancestor of the use-site scopes is exactly the
+ * scope of the node's immediate dominator in the dependency graph, rooted at
+ * the whole expression.  So we instead compute the immediate dominator of
+ * every node with the Lengauer-Tarjan algorithm - a single DFS followed by one
+ * bottom-up sweep using union-find with path compression - and then read every
+ * scope off the dominator tree in one top-down pass.  This makes scope
+ * resolution near-linear in the size of the dependency graph.
+ */
+class ScopeCalculator {
+ public:
+  static std::unordered_map<DependencyGraph::Node*, Scope> Calc(const DependencyGraph& dg) {
+    ScopeCalculator sc;
+    sc.NumberNodes(dg);
+    sc.CalcIdom();
+    return sc.AssignScope(dg);
+  }
+
+ private:
+  /*! \brief Nodes in DFS preorder; index in this vector is the DFS number. */
+  std::vector<DependencyGraph::Node*> vertex_;
+  /*! \brief Maps a node to its DFS number. */
+  std::unordered_map<DependencyGraph::Node*, size_t> dfn_;
+  /*! \brief DFS-tree parent, semidominator, immediate dominator, by DFS number. */
+  std::vector<size_t> parent_, sdom_, idom_;
+  /*! \brief Union-find forest with sdom-minimum labels, by DFS number. */
+  std::vector<size_t> ancestor_, label_;
+
+  /* Number every node reachable from the root in DFS preorder, recording the
+   * DFS-tree parent.  The traversal is iterative so deep expressions cannot
+   * overflow the C++ stack.
+   */
+  void NumberNodes(const DependencyGraph& dg) {
+    CHECK(!dg.post_dfs_order.empty());
+    DependencyGraph::Node* root = dg.post_dfs_order.back();
+    std::vector<std::pair<DependencyGraph::Node*, size_t>> stack;
+    stack.emplace_back(root, 0);
+    while (!stack.empty()) {
+      DependencyGraph::Node* n = stack.back().first;
+      size_t p = stack.back().second;
+      stack.pop_back();
+      if (dfn_.count(n) != 0) {
+        continue;
+      }
+      size_t number = vertex_.size();
+      dfn_.insert({n, number});
+      vertex_.push_back(n);
+      parent_.push_back(p);
+      for (auto* iit = n->children.head; iit != nullptr; iit = iit->next) {
+        stack.emplace_back(iit->value, number);
+      }
     }
   }
-  return lhs;
-}
 
-std::unordered_map<DependencyGraph::Node*, Scope> CalcScope(const DependencyGraph& dg) {
-  std::unordered_map<DependencyGraph::Node*, Scope> expr_scope;
-  Scope global_scope = std::make_shared<ScopeNode>();
-  for (auto it = dg.post_dfs_order.rbegin(); it != dg.post_dfs_order.rend(); ++it) {
-    DependencyGraph::Node* n = *it;
-    auto iit = n->parents.head;
-    Scope s;
-    if (iit == nullptr) {
-      s = global_scope;
-    } else {
-      s = expr_scope.at(iit->value);
-      iit = iit->next;
-      for (; iit != nullptr; iit = iit->next) {
-        s = LCA(s, expr_scope.at(iit->value));
+  /* Find the union-find root reachable from v, compressing the path and
+   * propagating the minimum-semidominator label along it.  Iterative for the
+   * same stack-depth reason as above.
+   */
+  size_t Eval(size_t v) {
+    const size_t none = vertex_.size();
+    if (ancestor_[v] == none) {
+      return v;
+    }
+    std::vector<size_t> chain;
+    while (ancestor_[ancestor_[v]] != none) {
+      chain.push_back(v);
+      v = ancestor_[v];
+    }
+    for (auto it = chain.rbegin(); it != chain.rend(); ++it) {
+      size_t u = *it;
+      if (sdom_[label_[ancestor_[u]]] < sdom_[label_[u]]) {
+        label_[u] = label_[ancestor_[u]];
       }
+      ancestor_[u] = ancestor_[ancestor_[u]];
+      v = u;
     }
-    expr_scope.insert({n, n->new_scope ? ChildScope(s) : s});
+    return label_[v];
   }
-  return expr_scope;
+
+  void CalcIdom() {
+    const size_t n = vertex_.size();
+    sdom_.resize(n);
+    label_.resize(n);
+    idom_.assign(n, 0);
+    ancestor_.assign(n, n);
+    for (size_t i = 0; i < n; ++i) {
+      sdom_[i] = label_[i] = i;
+    }
+    std::vector<std::vector<size_t>> bucket(n);
+    for (size_t w = n - 1; w >= 1; --w) {
+      for (auto* iit = vertex_[w]->parents.head; iit != nullptr; iit = iit->next) {
+        size_t u = dfn_.at(iit->value);
+        size_t c = u < w ? u : sdom_[Eval(u)];
+        if (c < sdom_[w]) {
+          sdom_[w] = c;
+        }
+      }
+      bucket[sdom_[w]].push_back(w);
+      ancestor_[w] = parent_[w];
+      for (size_t v : bucket[parent_[w]]) {
+        size_t u = Eval(v);
+        idom_[v] = sdom_[u] < sdom_[v] ? u : parent_[w];
+      }
+      bucket[parent_[w]].clear();
+    }
+    for (size_t w = 1; w < n; ++w) {
+      if (idom_[w] != sdom_[w]) {
+        idom_[w] = idom_[idom_[w]];
+      }
+    }
+  }
+
+  /* The immediate dominator has a smaller DFS number than the node it
+   * dominates, so a single pass in DFS order sees every scope before the
+   * scopes that refine it.
+   */
+  std::unordered_map<DependencyGraph::Node*, Scope> AssignScope(const DependencyGraph& dg) {
+    std::unordered_map<DependencyGraph::Node*, Scope> expr_scope;
+    Scope global_scope = std::make_shared<ScopeNode>();
+    for (size_t w = 0; w < vertex_.size(); ++w) {
+      DependencyGraph::Node* n = vertex_[w];
+      const Scope& s = w == 0 ? global_scope : expr_scope.at(vertex_[idom_[w]]);
+      expr_scope.insert({n, n->new_scope ? ChildScope(s) : s});
+    }
+    return expr_scope;
+  }
+};
+
+std::unordered_map<DependencyGraph::Node*, Scope> CalcScope(const DependencyGraph& dg) {
+  return ScopeCalculator::Calc(dg);
 }
 
 bool IsPrimitiveFunction(const Expr& e) {
@@ -24,9 +24,17 @@
  *
  * \brief Turn A normal form into graph normal form.
  */
+#include <dmlc/common.h>
 #include <tvm/relay/pass.h>
 #include <tvm/relay/expr_functor.h>
+#include <tvm/relay/feature.h>
+#include <tvm/relay/op_attr_types.h>
+#include <algorithm>
+#include <string>
+#include <unordered_map>
+#include <vector>
 #include "let_list.h"
+#include "pass_util.h"
 
 namespace tvm {
 namespace relay {
@@ -51,8 +59,32 @@ class UseVarVisitor : public ExprVisitor {
 };
 
 class GNF : public ExprMutator {
+ public:
+  explicit GNF(bool use_cse) : use_cse_(use_cse) { }
+
  private:
   std::unordered_map<Var, Expr, NodeHash, NodeEqual> var_map_;
+  /*! \brief Buckets of syntactically equal rewritten nodes, keyed by structural hash. */
+  std::unordered_map<size_t, std::vector<Expr>> hash_bucket_;
+  /*! \brief Hash of every bucketed canonical node, so a parent combines the
+   *  hashes of its (already canonical) children in O(arity) instead of
+   *  rewalking the whole subtree per node. */
+  std::unordered_map<const Node*, size_t> hash_memo_;
+  /*! \brief Whether each canonical compound node is total: evaluating it
+   *  always terminates without effects, so it may be hoisted freely. */
+  std::unordered_map<const Node*, bool> total_memo_;
+  /*! \brief Whether merging syntactically equal nodes is safe for this program. */
+  bool use_cse_;
+
+  /*! \brief Upper bound on the tensor bytes folded into a constant's hash;
+   *  alpha equality still compares the full contents, so large weight
+   *  tensors are not rehashed wholesale. */
+  static const size_t kMaxConstantHashBytes = 64;
+
+  static size_t Combine(size_t lhs, size_t rhs) {
+    return dmlc::HashCombine(lhs, rhs);
+  }
+
   Expr VisitExpr_(const VarNode* vn) override {
     Var v = GetRef<Var>(vn);
     return var_map_.count(v) == 0 ? v : var_map_.at(v);
@@ -70,10 +102,176 @@ class GNF : public ExprMutator {
     var_map_.insert(std::pair<Var, Expr>(ln->var, VisitExpr(WrapRec(ln->var, ln->value))));
     return VisitExpr(ln->body);
   }
+
+  bool IsTotal(const Expr& e) const {
+    // variables, operators, constructors and literal values evaluate
+    // trivially; compound nodes are looked up from the bottom-up record
+    if (IsAtomic(e) || e.as<ConstantNode>() || e.as<FunctionNode>()) {
+      return true;
+    }
+    auto it = total_memo_.find(e.get());
+    return it != total_memo_.end() && it->second;
+  }
+
+  /* Totality of a compound node, one level deep via total_memo_: data nodes
+   * over total children, a conditional over total children, or a call whose
+   * callee is a stateless operator or a constructor applied to total
+   * arguments.  Everything else (lets, references, matches, calls through
+   * variables) is conservatively not total.
+   */
+  bool ComputeTotal(const Expr& e) const {
+    if (const TupleNode* t = e.as<TupleNode>()) {
+      for (const Expr& f : t->fields) {
+        if (!IsTotal(f)) {
+          return false;
+        }
+      }
+      return true;
+    } else if (const TupleGetItemNode* g = e.as<TupleGetItemNode>()) {
+      return IsTotal(g->tuple);
+    } else if (const IfNode* i = e.as<IfNode>()) {
+      return IsTotal(i->cond) && IsTotal(i->true_branch) && IsTotal(i->false_branch);
+    } else if (const CallNode* c = e.as<CallNode>()) {
+      static auto op_stateful = Op::GetAttr<TOpIsStateful>("TOpIsStateful");
+      if (const OpNode* op = c->op.as<OpNode>()) {
+        if (op_stateful.get(GetRef<Op>(op), false)) {
+          return false;
+        }
+      } else if (!c->op.as<ConstructorNode>()) {
+        return false;
+      }
+      for (const Expr& a : c->args) {
+        if (!IsTotal(a)) {
+          return false;
+        }
+      }
+      return true;
+    }
+    return false;
+  }
+
+  /* Sharing is only safe when evaluation of the node is total.  A later
+   * to_a_normal_form binds a shared node at the common dominator of its
+   * uses, so merging syntactically equal nodes from sibling branch arms
+   * makes them unconditionally evaluated there; if the node could diverge
+   * or have effects (e.g. it embeds a call through a variable), that
+   * changes behaviour, not just cost.  Atoms are already as shared as they
+   * can be, and binder-carrying nodes are kept unique.
+   */
+  bool CanShare(const Expr& e) const {
+    return !IsAtomic(e) && !e.as<FunctionNode>() && IsTotal(e);
+  }
+
+  size_t ExprHash(const Expr& e) const {
+    auto it = hash_memo_.find(e.get());
+    if (it != hash_memo_.end()) {
+      return it->second;
+    }
+    // Nodes that are never merged (variables, operators, ...) are unique in
+    // the rebuilt program, so identity is a faithful hash for them.
+    return std::hash<const Node*>()(e.get());
+  }
+
+  size_t ConstantHash(const ConstantNode* op) const {
+    const runtime::NDArray& array = op->data;
+    if (array->ctx.device_type != kDLCPU) {
+      return std::hash<const Node*>()(op);
+    }
+    size_t hash = std::hash<uint8_t>()(array->dtype.code);
+    hash = Combine(hash, std::hash<uint8_t>()(array->dtype.bits));
+    hash = Combine(hash, std::hash<uint16_t>()(array->dtype.lanes));
+    for (int i = 0; i < array->ndim; ++i) {
+      hash = Combine(hash, std::hash<int64_t>()(array->shape[i]));
+    }
+    size_t data_size = runtime::GetDataSize(*array.operator->());
+    const uint8_t* data = reinterpret_cast<const uint8_t*>(array->data);
+    // the cast avoids odr-using the in-class constant, which has no
+    // namespace-scope definition to link against
+    size_t hash_bytes = std::min(data_size, static_cast<size_t>(kMaxConstantHashBytes));
+    for (size_t i = 0; i < hash_bytes; ++i) {
+      hash = Combine(hash, std::hash<uint8_t>()(data[i]));
+    }
+    return hash;
+  }
+
+  /* Hash of a rewritten node, one level deep: the children are already
+   * canonical, so their memoized hashes (or their identities) summarize the
+   * subtrees below them.  Alpha equality filters out any collision, so the
+   * hash only has to be cheap, not perfect.
+   */
+  size_t ShallowHash(const Expr& e) const {
+    size_t hash = std::hash<std::string>()(e->type_key());
+    if (const ConstantNode* c = e.as<ConstantNode>()) {
+      return Combine(hash, ConstantHash(c));
+    } else if (const TupleNode* t = e.as<TupleNode>()) {
+      for (const Expr& f : t->fields) {
+        hash = Combine(hash, ExprHash(f));
+      }
+      return hash;
+    } else if (const TupleGetItemNode* g = e.as<TupleGetItemNode>()) {
+      hash = Combine(hash, ExprHash(g->tuple));
+      return Combine(hash, std::hash<int>()(g->index));
+    } else if (const CallNode* c = e.as<CallNode>()) {
+      hash = Combine(hash, ExprHash(c->op));
+      for (const Expr& a : c->args) {
+        hash = Combine(hash, ExprHash(a));
+      }
+      if (c->attrs.defined()) {
+        hash = Combine(hash, c->attrs->ContentHash(AttrsHash()));
+      }
+      return hash;
+    } else if (const IfNode* i = e.as<IfNode>()) {
+      hash = Combine(hash, ExprHash(i->cond));
+      hash = Combine(hash, ExprHash(i->true_branch));
+      return Combine(hash, ExprHash(i->false_branch));
+    }
+    // Binder-carrying nodes (functions, matches) would need alpha-aware
+    // hashing to merge distinct copies; hash them by identity so only
+    // references to the same node collapse, which the memo already gives.
+    return std::hash<const Node*>()(e.get());
+  }
+
+  /* Common subexpression elimination on the rebuilt DAG: bucket rewritten
+   * nodes by structural hash and return the canonical member of the bucket,
+   * with alpha equality as the verification predicate.  Syntactically equal
+   * subtrees thus collapse into a single shared node.
+   */
+  Expr Canonicalize(const Expr& e) {
+    if (!use_cse_) {
+      return e;
+    }
+    if (!IsAtomic(e) && total_memo_.count(e.get()) == 0) {
+      total_memo_[e.get()] = ComputeTotal(e);
+    }
+    if (!CanShare(e)) {
+      return e;
+    }
+    size_t hash = ShallowHash(e);
+    std::vector<Expr>& bucket = hash_bucket_[hash];
+    for (const Expr& candidate : bucket) {
+      if (AlphaEqual(candidate, e)) {
+        return candidate;
+      }
+    }
+    hash_memo_[e.get()] = hash;
+    bucket.push_back(e);
+    return e;
+  }
+
+  Expr VisitExpr(const Expr& e) override {
+    Expr ret = Canonicalize(ExprMutator::VisitExpr(e));
+    memo_[e] = ret;
+    return ret;
+  }
 };
 
 Expr ToGraphNormalForm(const Expr& e) {
-  return GNF()(e);
+  /* A program that creates, reads or writes references can observe sharing,
+   * so only deduplicate when no reference feature is present.
+   */
+  FeatureSet fs = DetectFeature(e);
+  bool use_cse = fs.is_subset_of(FeatureSet::AllFeature() - fRefCreate - fRefRead - fRefWrite);
+  return GNF(use_cse)(e);
 }
 
 TVM_REGISTER_API("relay._ir_pass.to_graph_normal_form")
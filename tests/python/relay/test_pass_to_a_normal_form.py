@@ -25,11 +25,21 @@ from tvm.relay.testing import add_nat_definitions, count
 from tvm.relay.feature import Feature
 
 
-def check_eval(expr, expected_result, mod=None, rtol=1e-07):
-    ctx = tvm.context("llvm", 0)
-    intrp = create_executor(mod=mod, ctx=ctx, target="llvm")
+# executors are cached per module so that every test shares a single LLVM
+# JIT context instead of re-entering the compile engine.  updates to a
+# cached module stay visible, as the executor holds the module itself.
+_EXEC_CACHE = {}
+
+def _get_intrp(mod):
+    key = id(mod) if mod is not None else None
+    if key not in _EXEC_CACHE:
+        ctx = tvm.context("llvm", 0)
+        _EXEC_CACHE[key] = create_executor(mod=mod, ctx=ctx, target="llvm")
+    return _EXEC_CACHE[key]
 
-    result = intrp.evaluate(expr)
+
+def check_eval(expr, expected_result, mod=None, rtol=1e-07):
+    result = _get_intrp(mod).evaluate(expr)
     np.testing.assert_allclose(result.asnumpy(), expected_result, rtol=rtol)
 
 
@@ -101,7 +111,6 @@ def test_recursion():
        }
        sum_twice(5);
     """
-    return # cannot be run as fuse_ops need to recursively visit
     mod = relay.Module()
     i64 = relay.TensorType((), 'int64')
     f = relay.GlobalVar("f")
@@ -140,8 +149,7 @@ def test_nat_add():
     add = p.add
     s = p.s
     z = p.z
-    ctx = tvm.context("llvm", 0)
-    intrp = create_executor(mod=mod, ctx=ctx, target="llvm")
+    intrp = _get_intrp(mod)
     assert mod[add].checked_type == relay.FuncType([nat(), nat()], nat())
     assert count(p, intrp.evaluate(add(s(z()), s(z())))) == 2
     assert count(p, intrp.evaluate(to_a_normal_form(add(s(z()), s(z())), mod))) == 2
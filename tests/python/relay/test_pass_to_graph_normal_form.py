@@ -23,14 +23,21 @@ from tvm.relay.feature import Feature
 from tvm.relay.backend.interpreter import Value, TupleValue
 
 
-def check_eval(expr, args, expected_result, mod=None, rtol=1e-07):
-    if mod is None:
-        mod = relay.Module()
+# executors are cached per module so that every test shares a single LLVM
+# JIT context instead of re-entering the compile engine.  updates to a
+# cached module stay visible, as the executor holds the module itself.
+_EXEC_CACHE = {}
+
+def _get_intrp(mod):
+    key = id(mod) if mod is not None else None
+    if key not in _EXEC_CACHE:
+        ctx = tvm.context("llvm", 0)
+        _EXEC_CACHE[key] = create_executor(mod=mod, ctx=ctx, target="llvm")
+    return _EXEC_CACHE[key]
 
-    ctx = tvm.context("llvm", 0)
-    intrp = create_executor(mod=mod, ctx=ctx, target="llvm")
 
-    result = intrp.evaluate(expr)(*args)
+def check_eval(expr, args, expected_result, mod=None, rtol=1e-07):
+    result = _get_intrp(mod).evaluate(expr)(*args)
     np.testing.assert_allclose(result.asnumpy(), expected_result, rtol=rtol)
 
 